@@ -0,0 +1,572 @@
+# extract.py
+# Job advert extraction helpers shared by the pages. Kept out of the page script so
+# the clients, caches and compiled patterns are set up once per process, not per rerun.
+import asyncio
+import hashlib
+import re
+from functools import lru_cache
+from io import BytesIO, StringIO
+
+import httpx
+import orjson
+import streamlit as st
+from openai import AsyncOpenAI, OpenAI
+
+
+# heavier dependencies are imported on first use, so pages that never fetch a URL
+# or parse an upload don't pay for them on cold start
+@lru_cache(maxsize=1)
+def _requests():
+    import requests
+    return requests
+
+
+@lru_cache(maxsize=1)
+def _beautiful_soup():
+    from bs4 import BeautifulSoup
+    return BeautifulSoup
+
+
+# optional parsers
+@lru_cache(maxsize=1)
+def _docx():
+    try:
+        import docx  # python-docx
+    except ImportError:
+        return None
+    return docx
+
+
+@lru_cache(maxsize=1)
+def _pdf_reader():
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return None
+    return PdfReader
+
+# --------------------------
+# CONFIG / CONSTANTS
+# --------------------------
+TARGET_SCHEMA = {
+    "job_title": "",
+    "department": "",
+    "location": "",
+    "salary": "",
+    "grade": "",
+    "closing_date": "",
+    "summary": "",
+    "responsibilities": "",
+    "essential_criteria": "",
+    "desirable_criteria": ""
+}
+
+# content fields we want to optimise
+CONTENT_FIELDS = [
+    "summary",
+    "responsibilities",
+    "essential_criteria",
+    "desirable_criteria",
+]
+
+# needs a model that supports structured outputs (response_format=json_schema)
+MODEL = "gpt-4o-mini"
+# bump whenever the extraction prompt changes so cached results are not reused
+PROMPT_VERSION = "v2"
+
+_SCHEME_RE = re.compile(r"^https?://")
+
+# cheap pre-extraction for fields that follow a predictable shape in adverts; each needs its
+# label just before the value, so a posted date or an "SEO specialist" isn't taken for the field
+_PREFILL_PATTERNS = {
+    "salary": re.compile(
+        r"\bsalary\W{0,20}(£\d{1,3}(?:,\d{3})+(?:\s*(?:-|–|to)\s*£\d{1,3}(?:,\d{3})+)?)", re.IGNORECASE
+    ),
+    "closing_date": re.compile(r"\bclosing date\W{0,20}(\d{4}-\d{2}-\d{2})\b", re.IGNORECASE),
+    "grade": re.compile(
+        r"\b(?:grade\W{0,20}(SCS\s*\d?|G6|G7|SEO|HEO|EO|AA|AO)|(Grade\s+\d+))\b", re.IGNORECASE
+    ),
+}
+
+# adverts are short; anything past this is appendices and just costs tokens
+MAX_PDF_PAGES = 20
+
+# character budget for advert text sent to OpenAI; the opening is always kept for title/department
+MAX_CHARS = 12_000
+HEAD_CHARS = 2_000
+# adverts sent per OpenAI call in batch mode; keeps prompt and reply well inside the model limits
+MAX_BATCH_DOCS = 8
+_TRAILING_WS_RE = re.compile(r"[ \t]+\n")
+_BLANK_LINES_RE = re.compile(r"\n\s*\n")
+# lines kept with a keyword line, e.g. "Closing date" and the date on the line after it
+_BLOCK_LINES = 8
+_CONDENSE_KEYWORDS = (
+    "salary", "grade", "closing date", "location", "department", "summary",
+    "responsibilit", "essential", "desirable", "criteria", "about the job",
+)
+
+
+# OpenAI client
+@st.cache_resource
+def get_openai() -> OpenAI:
+    """OpenAI client with a keep-alive pool, built once and reused across reruns."""
+    http_client = httpx.Client(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100, keepalive_expiry=30.0),
+        timeout=httpx.Timeout(30.0, connect=5.0),
+    )
+    return OpenAI(http_client=http_client)
+
+
+# browser-like UA so job boards don't reject us
+USER_AGENT = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
+    'AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/91.0.4472.124 Safari/537.36'
+)
+
+
+@st.cache_resource
+def get_session():
+    """Shared HTTP session so URL fetches reuse pooled connections across reruns."""
+    requests = _requests()
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    adapter = HTTPAdapter(
+        pool_connections=20,
+        pool_maxsize=100,
+        max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": USER_AGENT, "Accept-Charset": "utf-8"})
+    return session
+
+
+# --------------------------
+# UTILS
+# --------------------------
+def extract_text_from_upload(uploaded_file):
+    if uploaded_file is None:
+        return ""
+
+    # read bytes once; they double as the _decode_bytes cache key, and each parser wraps them in a single BytesIO
+    try:
+        data = uploaded_file.getvalue()
+    except Exception:
+        try:
+            uploaded_file.seek(0)
+            data = uploaded_file.read()
+        except Exception:
+            return ""
+
+    return _decode_bytes(uploaded_file.name.lower(), data)
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _decode_bytes(name: str, data: bytes) -> str:
+    """Decode an uploaded file to text. Cached on the file's name and bytes so reruns skip re-parsing."""
+    if name.endswith(".txt"):
+        try:
+            return data.decode("utf-8", errors="ignore")
+        except Exception:
+            return data.decode("latin-1", errors="ignore")
+
+    if name.endswith(".docx"):
+        docx = _docx()
+        if not docx:
+            st.error("DOCX support not installed. Add python-docx to requirements.")
+            return ""
+        try:
+            document = docx.Document(BytesIO(data))
+            buf = StringIO()
+            for p in document.paragraphs:
+                text = p.text
+                if text:
+                    buf.write(text)
+                    buf.write("\n")
+            return buf.getvalue()
+        except Exception as e:
+            st.error(f"Could not parse DOCX: {e}")
+            return ""
+
+    if name.endswith(".pdf"):
+        PdfReader = _pdf_reader()
+        if not PdfReader:
+            st.error("PDF support not installed. Add pypdf to requirements.")
+            return ""
+        try:
+            reader = PdfReader(BytesIO(data))
+            buf = StringIO()
+            for page in reader.pages[:MAX_PDF_PAGES]:
+                text = page.extract_text()
+                if text:
+                    buf.write(text)
+                    buf.write("\n")
+            return buf.getvalue()
+        except Exception as e:
+            st.error(f"Could not parse PDF: {e}")
+            return ""
+
+    return ""
+
+
+def extract_text_from_url(url: str, show_debug: bool = False) -> str:
+    if not url:
+        return ""
+
+    if not _SCHEME_RE.match(url):
+        url = 'https://' + url
+
+    requests = _requests()
+    try:
+        # separate connect / read timeouts
+        res = get_session().get(url, timeout=(3, 10), verify=True)
+        res.raise_for_status()
+
+        if show_debug:
+            st.write(f"Response status code: {res.status_code}")
+            st.write(f"Response content type: {res.headers.get('content-type', 'unknown')}")
+
+        # parse the raw bytes so the body isn't decoded twice; only trust an explicit charset,
+        # otherwise requests guesses ISO-8859-1 and the parser should sniff <meta charset> itself
+        from_encoding = res.encoding if "charset" in res.headers.get("content-type", "").lower() else None
+        soup = _beautiful_soup()(res.content, "lxml", from_encoding=from_encoding)
+
+        for elem in soup.select("script, style, noscript, header, footer, nav, iframe"):
+            elem.decompose()
+
+        main_content = (
+            soup.find('main') or
+            soup.find('article') or
+            soup.find('div', class_='content') or
+            soup
+        )
+
+        text = main_content.get_text(separator="\n", strip=True)
+
+        if not text:
+            st.warning("No text was extracted from the page")
+        else:
+            if show_debug:
+                st.info(f"Successfully extracted {len(text)} characters of text")
+                st.write("Preview:", text[:100] + "...")
+
+        return text
+
+    except requests.exceptions.SSLError as e:
+        st.error(f"SSL Certificate Error: {e}")
+        return ""
+    except requests.exceptions.ConnectionError:
+        st.error("Connection error — check the URL and your connection.")
+        return ""
+    except requests.exceptions.Timeout:
+        st.error("The request timed out.")
+        return ""
+    except requests.exceptions.RequestException as e:
+        st.error(f"Error fetching URL: {e}")
+        return ""
+
+
+def _extraction_key(raw_text: str, schema: dict) -> str:
+    """Content address for an extraction: model, prompt version, schema fields and text."""
+    return hashlib.sha256(b"|".join([
+        MODEL.encode(),
+        PROMPT_VERSION.encode(),
+        ",".join(schema).encode(),
+        raw_text.encode(),
+    ])).hexdigest()
+
+
+def _advert_schema(schema: dict) -> dict:
+    """Strict JSON Schema for the fields in `schema`, all strings, all required."""
+    return {
+        "type": "object",
+        "properties": {k: {"type": "string"} for k in schema},
+        "required": list(schema),
+        "additionalProperties": False,
+    }
+
+
+def _response_format(name: str, json_schema: dict) -> dict:
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": name, "strict": True, "schema": json_schema},
+    }
+
+
+def _missing_keys_error(parsed, schema: dict):
+    missing = [k for k in schema if not isinstance(parsed, dict) or k not in parsed]
+    return f"missing fields: {', '.join(missing)}" if missing else None
+
+
+def _request_json(prompt: str, response_format: dict, check) -> dict:
+    """Ask OpenAI for structured JSON. `check` returns an error message for an unusable reply, or None."""
+    messages = [
+        {"role": "system", "content": "You convert unstructured job adverts into structured JSON."},
+        {"role": "user", "content": prompt}
+    ]
+
+    # one retry, telling the model what was wrong with its first answer
+    for _ in range(2):
+        resp = get_openai().chat.completions.create(
+            model=MODEL,
+            messages=messages,
+            temperature=0,
+            response_format=response_format
+        )
+
+        # a refusal or a reply cut off at the token limit won't be fixed by retrying the same prompt
+        choice = resp.choices[0]
+        if choice.finish_reason == "length":
+            raise ValueError("OpenAI reply was cut off at the output token limit")
+        message = choice.message
+        if getattr(message, "refusal", None):
+            raise ValueError(f"OpenAI refused the request: {message.refusal}")
+        raw_json = (message.content or "").strip()
+        if not raw_json:
+            raise ValueError("Empty response from OpenAI")
+
+        try:
+            parsed = orjson.loads(raw_json)
+        except orjson.JSONDecodeError as e:
+            error = f"invalid JSON: {e}"
+        else:
+            error = check(parsed)
+            if error is None:
+                return parsed
+
+        messages += [
+            {"role": "assistant", "content": raw_json},
+            {"role": "user", "content": f"That response was not valid ({error}). Return JSON matching the schema."}
+        ]
+
+    raise ValueError(error)
+
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def _structure_cached(key: str, _raw_text: str, _schema: dict) -> dict:
+    """Run the OpenAI extraction. Only `key` is hashed by Streamlit; failures raise so they are never cached."""
+    prompt = f"""
+Extract the fields from this UK Civil Service job advert. Use an empty string for anything not stated.
+
+Text:
+\"\"\"{_raw_text}\"\"\"
+"""
+    return _request_json(
+        prompt,
+        _response_format("JobAdvert", _advert_schema(_schema)),
+        lambda parsed: _missing_keys_error(parsed, _schema),
+    )
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _structure_batch_cached(key: str, _texts: list, _schema: dict) -> list:
+    """Extract several adverts in one OpenAI call. Returns one dict per text, in order."""
+    docs = "\n\n".join(f"<<<doc id={i}>>>\n{t}\n<<<end>>>" for i, t in enumerate(_texts))
+    prompt = f"""
+Extract the fields from each UK Civil Service job advert below. Each advert sits between <<<doc id=N>>> and <<<end>>>.
+Return one entry per advert with its doc_id. Use an empty string for anything not stated.
+
+{docs}
+"""
+    # structured outputs need an object at the root, so the array goes under "adverts"
+    item = _advert_schema(_schema)
+    item["properties"] = {"doc_id": {"type": "integer"}, **item["properties"]}
+    item["required"] = ["doc_id", *item["required"]]
+    batch_schema = {
+        "type": "object",
+        "properties": {"adverts": {"type": "array", "items": item}},
+        "required": ["adverts"],
+        "additionalProperties": False,
+    }
+
+    def check(parsed):
+        adverts = parsed.get("adverts") if isinstance(parsed, dict) else None
+        if not isinstance(adverts, list):
+            return "missing adverts array"
+        complete = {a.get("doc_id") for a in adverts if isinstance(a, dict) and not _missing_keys_error(a, _schema)}
+        missing = [i for i in range(len(_texts)) if i not in complete]
+        return f"missing or incomplete doc ids: {missing}" if missing else None
+
+    parsed = _request_json(prompt, _response_format("JobAdverts", batch_schema), check)
+    by_id = {a["doc_id"]: a for a in parsed["adverts"] if isinstance(a, dict)}
+    return [{k: by_id[i][k] for k in _schema} for i in range(len(_texts))]
+
+
+def _regex_prefill(text: str) -> dict:
+    """Pull the fields that regexes can find reliably, so OpenAI only has to do the rest."""
+    found = {}
+    for field, pattern in _PREFILL_PATTERNS.items():
+        match = pattern.search(text)
+        if match:
+            found[field] = match.group(match.lastindex)
+    return found
+
+
+def _condense_blocks(text: str) -> list:
+    """Split text into paragraphs, and paragraphs into blocks that start at a keyword line.
+
+    Scraped pages come out one text node per line with labels and values on separate
+    lines, so a block carries a keyword line together with up to _BLOCK_LINES after it.
+    """
+    blocks = []
+    for para in _BLANK_LINES_RE.split(text):
+        current = []
+        for line in para.split("\n"):
+            if current and (len(current) >= _BLOCK_LINES or any(k in line.lower() for k in _CONDENSE_KEYWORDS)):
+                blocks.append("\n".join(current))
+                current = []
+            current.append(line)
+        if current:
+            blocks.append("\n".join(current))
+    return blocks
+
+
+def _condense(text: str) -> str:
+    """Fit advert text into MAX_CHARS, keeping the opening and the blocks that mention target fields."""
+    text = _TRAILING_WS_RE.sub("\n", text)
+    text = _BLANK_LINES_RE.sub("\n\n", text).strip()
+    if len(text) <= MAX_CHARS:
+        return text
+
+    cut = text.rfind("\n", 0, HEAD_CHARS) + 1 or HEAD_CHARS
+    head, blocks = text[:cut], _condense_blocks(text[cut:])
+
+    # highest keyword score first; sort is stable so ties stay in document order
+    scores = [sum(b.lower().count(k) for k in _CONDENSE_KEYWORDS) for b in blocks]
+    budget = MAX_CHARS - len(head)
+    keep = {}
+    for i in sorted(range(len(blocks)), key=lambda i: -scores[i]):
+        if budget <= 1:
+            break
+        # a block too big for what is left is cut to fit rather than dropped
+        keep[i] = blocks[i][:budget - 1]
+        budget -= len(keep[i]) + 1
+    return head + "\n".join(keep[i] for i in sorted(keep))
+
+
+def call_openai_structurer(raw_text: str, schema: dict, show_debug: bool = False) -> dict:
+    prefilled = {**schema, **_regex_prefill(raw_text)}
+    missing = get_missing_fields(prefilled)
+    if not missing:
+        return prefilled
+    if show_debug:
+        st.write(f"Prefilled by pattern: {', '.join(k for k in schema if k not in missing) or 'none'}")
+
+    # only ask the model for what is still missing, from a trimmed copy of the text
+    remaining = {k: schema[k] for k in missing}
+    text = _condense(raw_text)
+    key = _extraction_key(text, remaining)
+    try:
+        # _structure_cached raises on incomplete replies, so anything it returns has every field
+        parsed = _structure_cached(key, text, remaining)
+        if show_debug:
+            st.write(f"Structured fields ready (cache key {key[:12]})")
+    except ValueError:
+        # response was not valid JSON
+        return prefilled
+    except Exception as e:
+        st.error(f"OpenAI API error: {e}")
+        return prefilled
+
+    return {**prefilled, **{k: parsed[k] for k in missing}}
+
+
+def call_openai_batch_structurer(raw_texts: list, schema: dict, show_debug: bool = False) -> list:
+    """Like call_openai_structurer, but for several adverts, sharing OpenAI calls between them."""
+    results = [{**schema, **_regex_prefill(t)} for t in raw_texts]
+    missing = [get_missing_fields(r) for r in results]
+    todo = [i for i, m in enumerate(missing) if m]
+
+    # one schema per call, so ask for every field still missing from any advert
+    remaining = {k: schema[k] for k in schema if any(k in missing[i] for i in todo)}
+    for start in range(0, len(todo), MAX_BATCH_DOCS):
+        chunk = todo[start:start + MAX_BATCH_DOCS]
+        texts = [_condense(raw_texts[i]) for i in chunk]
+        key = _extraction_key("\x00".join(texts), remaining)
+        try:
+            parsed = _structure_batch_cached(key, texts, remaining)
+        except ValueError as e:
+            # e.g. a long batch reply cut off at the token limit; extract these adverts one at a time
+            if show_debug:
+                st.write(f"Batch of {len(chunk)} adverts failed ({e}); extracting them individually")
+            for i in chunk:
+                results[i] = call_openai_structurer(raw_texts[i], schema, show_debug=show_debug)
+            continue
+        except Exception as e:
+            st.error(f"OpenAI API error: {e}")
+            break
+        if show_debug:
+            st.write(f"Structured {len(chunk)} adverts in one call (cache key {key[:12]})")
+        for i, fields in zip(chunk, parsed):
+            results[i].update({k: fields.get(k, "") for k in missing[i]})
+
+    return results
+
+
+def get_missing_fields(current_schema: dict):
+    return [k for k, v in current_schema.items() if not v or not str(v).strip()]
+
+
+def _optimise_messages(field_name: str, text: str) -> list:
+    prompt = f"""
+Rewrite the following {field_name.replace('_', ' ')} for a UK Civil Service style job advert.
+- keep the meaning
+- improve clarity and readability
+- user bullets for lists of more than three items
+- do NOT invent salary, grade, dates or department
+Return only the rewritten text.
+Text:
+{text}
+    """.strip()
+    return [
+        {"role": "system", "content": "You improve job-advert text."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def optimise_single_field(field_name: str, text: str) -> str:
+    """Call OpenAI to optimise a single content field."""
+    try:
+        resp = get_openai().chat.completions.create(
+            model=MODEL,
+            messages=_optimise_messages(field_name, text),
+            temperature=0.3
+        )
+        return resp.choices[0].message.content.strip()
+    except Exception:
+        return text
+
+
+async def _optimise_fields_async(fields: dict) -> dict:
+    # the async client's connections belong to this event loop, so it can't be cached like get_openai()
+    try:
+        aclient = AsyncOpenAI(http_client=httpx.AsyncClient(http2=True, timeout=httpx.Timeout(30.0, connect=5.0)))
+    except Exception:
+        # e.g. no OPENAI_API_KEY; leave the text as it was, like optimise_single_field
+        return dict(fields)
+
+    async with aclient:
+        async def optimise(field_name: str, text: str) -> str:
+            try:
+                resp = await aclient.chat.completions.create(
+                    model=MODEL,
+                    messages=_optimise_messages(field_name, text),
+                    temperature=0.3
+                )
+                return resp.choices[0].message.content.strip()
+            except Exception:
+                return text
+
+        results = await asyncio.gather(*(optimise(f, t) for f, t in fields.items()))
+    return dict(zip(fields, results))
+
+
+def optimise_fields(fields: dict) -> dict:
+    """Optimise several content fields at once, overlapping the OpenAI calls."""
+    if not fields:
+        return {}
+    return asyncio.run(_optimise_fields_async(fields))
@@ -1,15 +1,14 @@
 # pages/03_Interview_Question_Generator.py
 from password_gate import require_password
 require_password()
-import os
 import streamlit as st
-from openai import OpenAI
+from extract import get_openai
 
 st.set_page_config(page_title="Recruitment hub - Interview question generator", page_icon="💬")
 
 # ----- SETUP -----
-# Expect your key in env var; you can change this to st.secrets if you prefer
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Expect your key in OPENAI_API_KEY; the pooled client is shared with the job advert optimiser
+client = get_openai()
 
 st.title("Interview question generator (mock)")
 st.info('We could extend the hub to include other AI capabilities like a interview question generator.', icon="ℹ️")
@@ -1,54 +1,29 @@
 from password_gate import require_password
 require_password()
-import json
 import os
 import re
-from io import BytesIO
 
+import orjson
 import streamlit as st
-from openai import OpenAI
-import requests
-from bs4 import BeautifulSoup
 
-# optional parsers
-try:
-    import docx  # python-docx
-except ImportError:
-    docx = None
-
-try:
-    from pypdf import PdfReader
-except ImportError:
-    PdfReader = None
+from extract import (
+    CONTENT_FIELDS,
+    TARGET_SCHEMA,
+    call_openai_batch_structurer,
+    call_openai_structurer,
+    extract_text_from_upload,
+    extract_text_from_url,
+    get_missing_fields,
+    optimise_fields,
+    optimise_single_field,
+)
 
 # --------------------------
 # CONFIG / CONSTANTS
 # --------------------------
 st.set_page_config(page_title="Recruitment hub - Job optimiser", page_icon="🧠")
 
-TARGET_SCHEMA = {
-    "job_title": "",
-    "department": "",
-    "location": "",
-    "salary": "",
-    "grade": "",
-    "closing_date": "",
-    "summary": "",
-    "responsibilities": "",
-    "essential_criteria": "",
-    "desirable_criteria": ""
-}
-
-# content fields we want to optimise
-CONTENT_FIELDS = [
-    "summary",
-    "responsibilities",
-    "essential_criteria",
-    "desirable_criteria",
-]
-
-# OpenAI client
-client = OpenAI()
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
 
 # --------------------------
 # SESSION SETUP
@@ -72,201 +47,25 @@ if "optimised" not in st.session_state:
     # holds AI-suggested versions, e.g. {"summary": "...better text..."}
     st.session_state["optimised"] = {}
 
+if "adverts" not in st.session_state:
+    # one {"name", "schema"} entry per extracted advert; "schema" above is the one being worked on
+    st.session_state["adverts"] = []
+
+if "current_advert" not in st.session_state:
+    st.session_state["current_advert"] = 0
+
 # NEW: Role setup
 if "user_role" not in st.session_state:
     st.session_state["user_role"] = "Non-Advertiser"
 
 
-# --------------------------
-# UTILS
-# --------------------------
-def extract_text_from_upload(uploaded_file):
-    if uploaded_file is None:
-        return ""
-    name = uploaded_file.name.lower()
-
-    # read bytes once
-    try:
-        data = uploaded_file.read()
-    except Exception:
-        try:
-            data = uploaded_file.getvalue()
-        except Exception:
-            return ""
-
-    if name.endswith(".txt"):
-        try:
-            return data.decode("utf-8", errors="ignore")
-        except Exception:
-            return data.decode("latin-1", errors="ignore")
-
-    if name.endswith(".docx"):
-        if not docx:
-            st.error("DOCX support not installed. Add python-docx to requirements.")
-            return ""
-        try:
-            document = docx.Document(BytesIO(data))
-            return "\n".join(p.text for p in document.paragraphs)
-        except Exception as e:
-            st.error(f"Could not parse DOCX: {e}")
-            return ""
-
-    if name.endswith(".pdf"):
-        if not PdfReader:
-            st.error("PDF support not installed. Add pypdf to requirements.")
-            return ""
-        try:
-            reader = PdfReader(BytesIO(data))
-            return "\n".join((page.extract_text() or "") for page in reader.pages)
-        except Exception as e:
-            st.error(f"Could not parse PDF: {e}")
-            return ""
-
-    return ""
-
-
-def extract_text_from_url(url: str, show_debug: bool = False) -> str:
-    if not url:
-        return ""
-
-    if not url.startswith(('http://', 'https://')):
-        url = 'https://' + url
-
-    try:
-        headers = {
-            'User-Agent': (
-                'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
-                'AppleWebKit/537.36 (KHTML, like Gecko) '
-                'Chrome/91.0.4472.124 Safari/537.36'
-            )
-        }
-        res = requests.get(url, timeout=10, headers=headers, verify=True)
-        res.raise_for_status()
-
-        if show_debug:
-            st.write(f"Response status code: {res.status_code}")
-            st.write(f"Response content type: {res.headers.get('content-type', 'unknown')}")
-
-        soup = BeautifulSoup(res.text, "html.parser")
-
-        for elem in soup(["script", "style", "noscript", "header", "footer", "nav"]):
-            elem.decompose()
-
-        main_content = (
-            soup.find('main') or
-            soup.find('article') or
-            soup.find('div', class_='content') or
-            soup
-        )
-
-        text = main_content.get_text(separator="\n", strip=True)
-
-        if not text:
-            st.warning("No text was extracted from the page")
-        else:
-            if show_debug:
-                st.info(f"Successfully extracted {len(text)} characters of text")
-                st.write("Preview:", text[:100] + "...")
-
-        return text
-
-    except requests.exceptions.SSLError as e:
-        st.error(f"SSL Certificate Error: {e}")
-        return ""
-    except requests.exceptions.ConnectionError:
-        st.error("Connection error — check the URL and your connection.")
-        return ""
-    except requests.exceptions.Timeout:
-        st.error("The request timed out.")
-        return ""
-    except requests.exceptions.RequestException as e:
-        st.error(f"Error fetching URL: {e}")
-        return ""
-
-
-def call_openai_structurer(raw_text: str, schema: dict, show_debug: bool = False) -> dict:
-    schema_str = json.dumps(schema, indent=2)
-    prompt = f"""
-You are an information extraction assistant for UK Civil Service job adverts.
-Extract as many fields as you can from the text below and return ONLY valid JSON matching this schema.
-If you don't know a field, leave it as an empty string.
-
-Schema:
-{schema_str}
-
-Text:
-\"\"\"{raw_text}\"\"\"
-"""
-    try:
-        resp = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You convert unstructured job adverts into structured JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0
-        )
-        if show_debug:
-            st.write("OpenAI Response received successfully")
-    except Exception as e:
-        st.error(f"OpenAI API error: {e}")
-        return schema
-
-    raw_json = ""
-    try:
-        raw_json = resp.choices[0].message.content.strip()
-    except Exception:
-        try:
-            raw_json = str(resp.choices[0].message).strip()
-        except Exception:
-            raw_json = ""
-
-    if not raw_json:
-        try:
-            raw_json = json.dumps(resp)
-        except Exception:
-            return schema
-
-    try:
-        parsed = json.loads(raw_json)
-        return parsed
-    except Exception:
-        cleaned = raw_json.strip("` \n")
-        try:
-            return json.loads(cleaned)
-        except Exception:
-            return schema
-
-
-def get_missing_fields(current_schema: dict):
-    return [k for k, v in current_schema.items() if not v or not str(v).strip()]
-
-
-def optimise_single_field(field_name: str, text: str) -> str:
-    """Call OpenAI to optimise a single content field."""
-    prompt = f"""
-Rewrite the following {field_name.replace('_', ' ')} for a UK Civil Service style job advert.
-- keep the meaning
-- improve clarity and readability
-- user bullets for lists of more than three items
-- do NOT invent salary, grade, dates or department
-Return only the rewritten text.
-Text:
-{text}
-    """.strip()
-
-    try:
-        resp = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You improve job-advert text."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3
-        )
-        return resp.choices[0].message.content.strip()
-    except Exception:
-        return text
+def load_advert(extracted: dict):
+    """Make an extracted advert the one being reviewed."""
+    st.session_state["schema"] = extracted.copy()
+    st.session_state["pending_fields"] = get_missing_fields(extracted)
+    st.session_state["current_field"] = None
+    st.session_state["extracted"] = True
+    st.session_state["optimised"] = {}
 
 
 # --------------------------
@@ -317,12 +116,16 @@ with tab1:
         horizontal=True
     )
 
-    uploaded_file = None
+    uploaded_files = []
     pasted_text = ""
     url = ""
 
     if source_type == "Upload a file":
-        uploaded_file = st.file_uploader("Upload job advert (.txt / .docx / .pdf)", type=["txt", "docx", "pdf"])
+        uploaded_files = st.file_uploader(
+            "Upload job advert(s) (.txt / .docx / .pdf)",
+            type=["txt", "docx", "pdf"],
+            accept_multiple_files=True
+        )
     elif source_type == "Paste text":
         pasted_text = st.text_area("Paste the job advert text here", height=160)
     else:
@@ -332,35 +135,41 @@ with tab1:
 
     # Provide extraction action directly on the Source tab
     if st.button("Extract from source"):
-        source_text = ""
+        docs = []
         detected_source = None
 
-        if source_type == "Upload a file" and uploaded_file:
-            source_text = extract_text_from_upload(uploaded_file)
-            detected_source = "file"
+        if source_type == "Upload a file" and uploaded_files:
+            for f in uploaded_files:
+                text = extract_text_from_upload(f)
+                if text:
+                    docs.append((f.name, text))
+            detected_source = "file" if len(docs) == 1 else f"{len(docs)} files"
         elif source_type == "Paste text" and pasted_text.strip():
-            source_text = pasted_text.strip()
+            docs = [("Pasted text", pasted_text.strip())]
             detected_source = "pasted text"
         elif source_type == "Use a URL" and url.strip():
-            source_text = extract_text_from_url(url.strip(), show_debug=show_debug)
+            text = extract_text_from_url(url.strip(), show_debug=show_debug)
+            if text:
+                docs = [(url.strip(), text)]
             detected_source = "URL"
 
-        if not source_text:
+        if not docs:
             st.warning("Please provide a source above first.")
         else:
             with st.spinner("Extracting fields with OpenAI..."):
-                extracted = call_openai_structurer(source_text, TARGET_SCHEMA, show_debug=show_debug)
-
-            if isinstance(extracted, dict):
-                st.session_state["schema"] = extracted.copy()
-                missing_fields = get_missing_fields(extracted)
-                st.session_state["pending_fields"] = missing_fields
-                st.session_state["current_field"] = None
-                st.session_state["extracted"] = True
+                if len(docs) == 1:
+                    results = [call_openai_structurer(docs[0][1], TARGET_SCHEMA, show_debug=show_debug)]
+                else:
+                    # several uploads share OpenAI calls instead of one round-trip each
+                    results = call_openai_batch_structurer([text for _, text in docs], TARGET_SCHEMA, show_debug=show_debug)
+
+            if all(isinstance(r, dict) for r in results):
+                st.session_state["adverts"] = [{"name": name, "schema": r.copy()} for (name, _), r in zip(docs, results)]
+                st.session_state["current_advert"] = 0
                 st.session_state["detected_source"] = detected_source
-                st.session_state["optimised"] = {}
+                load_advert(results[0])
 
-                if missing_fields:
+                if any(get_missing_fields(r) for r in results):
                     st.success("Extracted what I could. You can now optimise the content or fill in the rest.")
                 else:
                     st.success("Successfully extracted all fields! ✅")
@@ -370,6 +179,22 @@ with tab1:
     if st.session_state.get("detected_source"):
         st.caption(f"Detected source: {st.session_state['detected_source']}")
 
+    adverts = st.session_state["adverts"]
+    if len(adverts) > 1:
+        current = st.session_state["current_advert"]
+        choice = st.selectbox(
+            "Working on advert",
+            range(len(adverts)),
+            index=current,
+            format_func=lambda i: adverts[i]["name"]
+        )
+        if choice != current:
+            # keep any edits made to the advert we're leaving
+            adverts[current]["schema"] = st.session_state["schema"]
+            st.session_state["current_advert"] = choice
+            load_advert(adverts[choice]["schema"])
+            st.rerun()
+
 
 # (Extraction is handled on the Source tab now.)
 
@@ -387,10 +212,10 @@ with tab2:
 
         if st.button("Optimise all existing content now"):
             # go through schema and optimise any content fields that currently have text
-            for cf in CONTENT_FIELDS:
-                current_val = st.session_state["schema"].get(cf, "")
-                if current_val:
-                    st.session_state["optimised"][cf] = optimise_single_field(cf, current_val)
+            schema = st.session_state["schema"]
+            st.session_state["optimised"].update(
+                optimise_fields({cf: schema[cf] for cf in CONTENT_FIELDS if schema.get(cf)})
+            )
             st.success("AI suggestions generated.")
             st.rerun()
 
@@ -420,24 +245,27 @@ with tab2:
 with tab3:
     st.subheader("3. Review & complete")
 
-    schema = st.session_state["schema"]
-    pending = st.session_state["pending_fields"]
+    # bind once; every session_state lookup goes through Streamlit's proxy
+    ss = st.session_state
+    schema = ss["schema"]
+    pending = ss["pending_fields"]
 
-    if not st.session_state["extracted"]:
+    if not ss["extracted"]:
         st.info("Run the extraction in the **source** tab first.")
     else:
         # progress
         total = len(TARGET_SCHEMA)
         done = sum(1 for v in schema.values() if v and str(v).strip())
+        has_any = done > 0
         st.progress(done / total)
         st.caption(f"{done} of {total} fields completed")
 
         # ----- A) wizard-style fill the next missing field -----
-        if pending and any(schema.values()):
-            if st.session_state["current_field"] is None:
-                st.session_state["current_field"] = pending[0]
+        if pending and has_any:
+            if ss["current_field"] is None:
+                ss["current_field"] = pending[0]
 
-            field = st.session_state["current_field"]
+            field = ss["current_field"]
             pretty_label = field.replace("_", " ").title()
 
             st.markdown("#### Quick fix")
@@ -449,35 +277,38 @@ with tab3:
             if field == "salary":
                 hint = " (e.g. £38,000 - £44,000 national)"
 
-            user_input = st.text_input(f"{pretty_label}{hint}:", key=f"input_{field}")
+            # a form so typing doesn't rerun the script; only the submit does
+            with st.form("quick_fix", clear_on_submit=True):
+                user_input = st.text_input(f"{pretty_label}{hint}:", key=f"input_{field}")
+                submitted = st.form_submit_button("Save this field")
 
-            if st.button("Save this field"):
+            if submitted:
                 answer = user_input.strip()
 
                 # validate closing date
                 if field == "closing_date" and answer:
-                    if not re.match(r"^\d{4}-\d{2}-\d{2}$", answer):
+                    if not _DATE_RE.match(answer):
                         st.warning("Please use format YYYY-MM-DD, e.g. 2025-11-07")
                     else:
-                        st.session_state["schema"][field] = answer
+                        schema[field] = answer
                         # if optimisable, generate suggestion now
                         if field in CONTENT_FIELDS and answer:
                             ai_version = optimise_single_field(field, answer)
-                            st.session_state["optimised"][field] = ai_version
-                        st.session_state["pending_fields"] = [f for f in pending if f != field]
-                        st.session_state["current_field"] = None
+                            ss["optimised"][field] = ai_version
+                        ss["pending_fields"] = [f for f in pending if f != field]
+                        ss["current_field"] = None
                         st.rerun()
                 else:
-                    st.session_state["schema"][field] = answer
+                    schema[field] = answer
                     # if optimisable, generate suggestion now
                     if field in CONTENT_FIELDS and answer:
                         ai_version = optimise_single_field(field, answer)
-                        st.session_state["optimised"][field] = ai_version
-                    st.session_state["pending_fields"] = [f for f in pending if f != field]
-                    st.session_state["current_field"] = None
+                        ss["optimised"][field] = ai_version
+                    ss["pending_fields"] = [f for f in pending if f != field]
+                    ss["current_field"] = None
                     st.rerun()
         else:
-            if all(schema.values()):
+            if done == total:
                 st.success("All fields complete ✅")
             else:
                 st.success("No more obvious missing fields. You can still edit below.")
@@ -512,31 +343,30 @@ with tab3:
                 "desirable_criteria": desirable_criteria,
             }
 
-            st.session_state["schema"] = updated_schema
+            ss["schema"] = updated_schema
 
             # optimise any content fields that now have text
-            for cf in CONTENT_FIELDS:
-                val = updated_schema.get(cf, "")
-                if val:
-                    st.session_state["optimised"][cf] = optimise_single_field(cf, val)
+            ss["optimised"].update(
+                optimise_fields({cf: updated_schema[cf] for cf in CONTENT_FIELDS if updated_schema.get(cf)})
+            )
 
             # recompute missing
-            st.session_state["pending_fields"] = [
+            ss["pending_fields"] = [
                 k for k, v in updated_schema.items() if not v or not str(v).strip()
             ]
-            st.session_state["current_field"] = None
+            ss["current_field"] = None
             st.success("All changes saved.")
             st.rerun()
 
         # ----- C) show current data + download -----
         st.markdown("### Current job data")
         with st.expander("Raw JSON"):
-            st.json(st.session_state["schema"])
+            st.json(schema)
 
-        if any(st.session_state["schema"].values()):
+        if has_any:
             st.download_button(
                 "Download JSON",
-                data=json.dumps(st.session_state["schema"], indent=2),
+                data=orjson.dumps(schema, option=orjson.OPT_INDENT_2),
                 file_name="job-schema.json",
                 mime="application/json"
             )
@@ -569,6 +399,6 @@ if is_advertiser:
                 st.success(f"**SUCCESS!** The job '{schema.get('job_title')}' has been mock-published!")
                 st.markdown("---")
                 st.markdown("### Mock Publishing Details")
-                st.write(f"**Job ID:** CSJ-MOCK-{abs(hash(json.dumps(schema))) % 100000}")
+                st.write(f"**Job ID:** CSJ-MOCK-{abs(hash(orjson.dumps(schema))) % 100000}")
                 st.write(f"**Status:** Published on Civil Service Jobs")
                 st.caption("You can now return to the **Source** tab to start a new job.")
\ No newline at end of file
@@ -1,6 +1,25 @@
 # password_gate.py
 import os, hmac, hashlib, streamlit as st
 PW_HASH = os.getenv("APP_PW_HASH", "")
+# APP_PW_HASH is "scrypt$<salt hex>$<hash hex>", or a bare sha256 hex digest (legacy).
+# Decoded once at import so the unlock click only hashes and compares bytes.
+def _parse_pw_hash(value):
+    try:
+        if value.startswith("scrypt$"):
+            _, salt, digest = value.split("$")
+            salt, digest = bytes.fromhex(salt), bytes.fromhex(digest)
+            if not salt or not digest:
+                return None, None
+            return salt, digest
+        digest = bytes.fromhex(value)
+        return (None, digest) if digest else (None, None)
+    except ValueError:
+        return None, None
+_PW_SALT, _PW_HASH_BYTES = _parse_pw_hash(PW_HASH) if PW_HASH else (None, None)
+def _hash_pw(pw):
+    if _PW_SALT is None:
+        return hashlib.sha256(pw.encode()).digest()
+    return hashlib.scrypt(pw.encode(), salt=_PW_SALT, n=2**14, r=8, p=1, dklen=len(_PW_HASH_BYTES))
 def require_password():
     if "authenticated" not in st.session_state:
         st.session_state.authenticated = False
@@ -10,9 +29,11 @@ def require_password():
         if st.button("Unlock"):
             if not PW_HASH:
                 st.error("No password configured on server")
+            elif _PW_HASH_BYTES is None:
+                st.error("Password hash on server is malformed")
             else:
-                hashed = hashlib.sha256(pw.encode()).hexdigest()
-                if hmac.compare_digest(hashed, PW_HASH):
+                hashed = _hash_pw(pw)
+                if hmac.compare_digest(hashed, _PW_HASH_BYTES):
                     st.session_state.authenticated = True
                     st.rerun()
                 else: